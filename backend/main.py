@@ -1,16 +1,25 @@
 from fastapi import FastAPI, HTTPException, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse, Response, StreamingResponse
+from starlette.datastructures import Headers
 from pydantic import BaseModel
 from typing import Optional, List
-import requests
-from groq import Groq
+import httpx
+import orjson
+import redis.asyncio as aioredis
+from cachetools import TTLCache
+from groq import AsyncGroq
 import os
+import re
+import asyncio
+import json
+import uuid
 from dotenv import load_dotenv
 
 load_dotenv()
 
-app = FastAPI(title="Weather Activity Advisor API")
+app = FastAPI(title="Weather Activity Advisor API", default_response_class=ORJSONResponse)
 
 # CORS middleware
 app.add_middleware(
@@ -21,16 +30,118 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+class StreamingAwareGZipMiddleware(GZipMiddleware):
+    """GZip middleware that leaves server-sent event streams uncompressed"""
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        async def bypass_event_streams(scope, receive, gzip_send):
+            # Compressing an event stream buffers it, which defeats streaming, so
+            # route those responses straight to the client based on their content type
+            target = gzip_send
+            
+            async def choose_send(message):
+                nonlocal target
+                if message["type"] == "http.response.start":
+                    content_type = Headers(raw=message["headers"]).get("content-type", "")
+                    if content_type.startswith("text/event-stream"):
+                        target = send
+                await target(message)
+            
+            await self.app(scope, receive, choose_send)
+        
+        gzip = GZipMiddleware(bypass_event_streams, minimum_size=self.minimum_size, compresslevel=self.compresslevel)
+        await gzip(scope, receive, send)
+
+
+# Compress larger JSON responses (chat history, weather payloads)
+app.add_middleware(StreamingAwareGZipMiddleware, minimum_size=1000)
+
 # API Keys
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 WEATHER_API_KEY = os.getenv("WEATHER_API_KEY")
 DEEPGRAM_API_KEY = os.getenv("DEEPGRAM_API_KEY")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# Maximum in-flight requests per upstream API (per worker)
+GROQ_CONCURRENCY = int(os.getenv("GROQ_CONCURRENCY", "10"))
+WEATHER_CONCURRENCY = int(os.getenv("WEATHER_CONCURRENCY", "20"))
+DEEPGRAM_CONCURRENCY = int(os.getenv("DEEPGRAM_CONCURRENCY", "10"))
 
 # Initialize Groq client
-groq_client = Groq(api_key=GROQ_API_KEY)
+groq_client = AsyncGroq(api_key=GROQ_API_KEY)
+
+# Sessions live in Redis so every worker sees the same state
+SESSION_TTL = 3600  # seconds
+# Chat history is kept in its own list, trimmed to the most recent messages
+CHAT_HISTORY_LIMIT = int(os.getenv("CHAT_HISTORY_LIMIT", "50"))
+
+# Weather changes on the order of minutes, so cache lookups briefly
+weather_cache = TTLCache(maxsize=1024, ttl=300)
+# Upstream requests currently in flight, keyed like weather_cache
+weather_inflight = {}
+
+
+@app.on_event("startup")
+async def startup():
+    # Shared async HTTP client for WeatherAPI and Deepgram; keep-alive reuses
+    # connections so warm requests skip the TCP/TLS handshake
+    app.state.http = httpx.AsyncClient(
+        timeout=httpx.Timeout(10.0, connect=5.0),
+        limits=httpx.Limits(max_connections=200, max_keepalive_connections=50, keepalive_expiry=60),
+        http2=True
+    )
+    app.state.redis = aioredis.from_url(REDIS_URL, decode_responses=True)
+    # Bound concurrent calls to each upstream so bursts don't trip rate limits
+    app.state.groq_sem = asyncio.Semaphore(GROQ_CONCURRENCY)
+    app.state.weather_sem = asyncio.Semaphore(WEATHER_CONCURRENCY)
+    app.state.deepgram_sem = asyncio.Semaphore(DEEPGRAM_CONCURRENCY)
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await app.state.http.aclose()
+    await app.state.redis.aclose()
+
+
+async def load_session(session_id: str):
+    """Load a session from Redis, or None if it doesn't exist"""
+    data = await app.state.redis.get(f"sess:{session_id}")
+    return json.loads(data) if data else None
+
+
+async def save_session(session_id: str, session: dict):
+    """Store a session in Redis, refreshing its expiry"""
+    await app.state.redis.set(f"sess:{session_id}", json.dumps(session), ex=SESSION_TTL)
+
+
+async def touch_session(session_id: str):
+    """Refresh a session's expiry without rewriting it"""
+    await app.state.redis.expire(f"sess:{session_id}", SESSION_TTL)
+
+
+async def load_chat_history(session_id: str):
+    """Load the chat history for a session"""
+    messages = await app.state.redis.lrange(f"chat:{session_id}", 0, -1)
+    return [json.loads(message) for message in messages]
 
-# In-memory storage (in production, use Redis or database)
-sessions = {}
+
+async def append_chat_history(session_id: str, *messages: dict):
+    """Append messages to a session's chat history, keeping only the most recent ones"""
+    key = f"chat:{session_id}"
+    async with app.state.redis.pipeline(transaction=True) as pipe:
+        pipe.rpush(key, *(json.dumps(message) for message in messages))
+        pipe.ltrim(key, -CHAT_HISTORY_LIMIT, -1)
+        pipe.expire(key, SESSION_TTL)
+        await pipe.execute()
+
+
+async def clear_chat_history(session_id: str):
+    """Delete the chat history for a session"""
+    await app.state.redis.delete(f"chat:{session_id}")
 
 
 # Request/Response models
@@ -91,16 +202,92 @@ translations = {
     }
 }
 
+# Example prompts
+examples = {
+    'en': {
+        "examples": [
+            "What should I wear today?",
+            "Best time to go outside?",
+            "Indoor activities for this weather?",
+            "Recommended sports for this weather?"
+        ]
+    },
+    'ja': {
+        "examples": [
+            "今日は何を着ればいいですか？",
+            "外出するのに良い時間は？",
+            "雨が降るので、室内でできることは？",
+            "この天気でおすすめのスポーツは？"
+        ]
+    }
+}
+
+# These never change, so serialize them once at import
+TRANSLATIONS_JSON = {language: orjson.dumps(value) for language, value in translations.items()}
+EXAMPLES_JSON = {language: orjson.dumps(value) for language, value in examples.items()}
+
+
+async def fetch_weather(location: str):
+    """Fetch weather data, served from cache when recently fetched"""
+    key = location.strip().lower()
+    if key in weather_cache:
+        return weather_cache[key]
+    
+    # Coalesce concurrent misses for the same location into one upstream request
+    task = weather_inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(request_weather(location))
+        weather_inflight[key] = task
+        
+        def on_done(t):
+            weather_inflight.pop(key, None)
+            if not t.cancelled() and t.exception() is None:
+                weather_cache[key] = t.result()
+        
+        task.add_done_callback(on_done)
+    
+    # Shield so one cancelled caller doesn't cancel the request for the others
+    return await asyncio.shield(task)
+
 
-def fetch_weather(location: str):
+async def request_weather(location: str):
     """Fetch weather data from WeatherAPI.com"""
+    # Error details are built by hand: httpx errors include the request URL,
+    # and with it the API key from the query string
+    url = "https://api.weatherapi.com/v1/current.json"
+    params = {"key": WEATHER_API_KEY, "q": location, "aqi": "no"}
     try:
-        url = f"http://api.weatherapi.com/v1/current.json?key={WEATHER_API_KEY}&q={location}&aqi=yes"
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        return response.json()
+        async with app.state.weather_sem:
+            response = await app.state.http.get(url, params=params)
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=400, detail=f"Error fetching weather: {e.__class__.__name__}")
+    
+    if response.is_error:
+        try:
+            message = response.json()['error']['message']
+        except Exception:
+            message = response.text
+        raise HTTPException(status_code=400, detail=f"Error fetching weather ({response.status_code}): {message}")
+    
+    try:
+        return slim_weather(response.json())
     except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Error fetching weather: {str(e)}")
+        raise HTTPException(status_code=400, detail=f"Error fetching weather: invalid response ({e.__class__.__name__})")
+
+
+def slim_weather(weather_data):
+    """Keep only the weather fields used for display and AI context"""
+    location = weather_data['location']
+    current = weather_data['current']
+    return {
+        'location': {k: location[k] for k in ('name', 'country', 'localtime')},
+        'current': {
+            k: current[k] for k in (
+                'temp_c', 'temp_f', 'feelslike_c', 'condition', 'humidity',
+                'wind_kph', 'wind_dir', 'precip_mm', 'uv', 'vis_km'
+            )
+        }
+    }
 
 
 def format_weather_data(weather_data):
@@ -122,41 +309,47 @@ def format_weather_data(weather_data):
         'precipitation': f"{current['precip_mm']} mm",
         'uv_index': current['uv'],
         'visibility': f"{current['vis_km']} km",
-        'local_time': location['localtime'],
-        'raw_data': weather_data  # Include raw data for AI context
+        'local_time': location['localtime']
     }
     return formatted
 
 
-def transcribe_audio_deepgram(audio_bytes: bytes, audio_format: Optional[str] = None, language: str = "en"):
+def format_weather_context(weather_data, header: str = "Weather in") -> str:
+    """Format weather data as prompt context for the AI"""
+    location = weather_data['location']
+    current = weather_data['current']
+    return f"""
+{header} {location['name']}, {location['country']}:
+- Temperature: {current['temp_c']}°C (feels like {current['feelslike_c']}°C)
+- Condition: {current['condition']['text']}
+- Humidity: {current['humidity']}%
+- Wind: {current['wind_kph']} km/h
+- UV Index: {current['uv']}
+- Precipitation: {current['precip_mm']} mm
+- Local time: {location['localtime']}
+"""
+
+
+async def iter_upload(file: UploadFile, chunk_size: int = 64 * 1024):
+    """Read an uploaded file in chunks so it is never held in memory whole"""
+    while chunk := await file.read(chunk_size):
+        yield chunk
+
+
+async def transcribe_audio_deepgram(audio, content_type: Optional[str] = None, language: str = "en"):
     """
     Transcribe audio using Deepgram API
     Supports 100+ audio formats: MP3, WAV, FLAC, M4A, OGG, OPUS, WEBM, etc.
+    Accepts the audio as bytes or as an async iterator of chunks to stream
     """
     try:
         url = "https://api.deepgram.com/v1/listen"
         
         headers = {
             "Authorization": f"Token {DEEPGRAM_API_KEY}",
+            "Content-Type": content_type or "audio/wav",
         }
         
-        # Content type mapping for different audio formats
-        content_type_map = {
-            'mp3': 'audio/mpeg',
-            'wav': 'audio/wav',
-            'flac': 'audio/flac',
-            'm4a': 'audio/mp4',
-            'ogg': 'audio/ogg',
-            'opus': 'audio/opus',
-            'webm': 'audio/webm',
-        }
-        
-        # Set content type based on format
-        if audio_format:
-            headers["Content-Type"] = content_type_map.get(audio_format.lower(), 'audio/wav')
-        else:
-            headers["Content-Type"] = "audio/wav"
-        
         # Deepgram API parameters
         params = {
             "model": "nova-3",
@@ -165,8 +358,12 @@ def transcribe_audio_deepgram(audio_bytes: bytes, audio_format: Optional[str] =
             "punctuate": "true"
         }
         
-        # Make the API request
-        response = requests.post(url, headers=headers, params=params, data=audio_bytes)
+        # Make the API request (transcription can take longer than the client default)
+        async with app.state.deepgram_sem:
+            response = await app.state.http.post(
+                url, headers=headers, params=params, content=audio,
+                timeout=httpx.Timeout(60.0, connect=5.0)
+            )
         
         if response.status_code == 200:
             result = response.json()
@@ -179,45 +376,118 @@ def transcribe_audio_deepgram(audio_bytes: bytes, audio_format: Optional[str] =
         raise HTTPException(status_code=500, detail=f"Transcription error: {str(e)}")
 
 
-def extract_location_from_query(query: str, language: str = "en") -> Optional[str]:
-    """Extract location name from user query as fallback if tool calling doesn't work"""
-    import re
-    
-    # Common location patterns - improved to capture city names better
-    location_patterns = [
+# Common location patterns - improved to capture city names better
+LOCATION_PATTERNS = [
+    re.compile(pattern, re.IGNORECASE) for pattern in [
         r'(?:in|at|for|to)\s+([A-Z][a-zA-Z]+(?:\s+[A-Z][a-zA-Z]+)?)(?:\?|\.|,|$|\s+(?:today|tomorrow|now|should|can))',
         r'([A-Z][a-zA-Z]+(?:\s+[A-Z][a-zA-Z]+)?)\s+(?:で|の|に|を)',
         r'(東京|大阪|京都|横浜|名古屋|福岡|札幌|仙台|広島|神戸)',  # Japanese city names
     ]
-    
-    # Known major cities for validation
-    major_cities = [
-        'tokyo', 'new york', 'london', 'paris', 'berlin', 'moscow', 'sydney',
-        'melbourne', 'toronto', 'vancouver', 'mumbai', 'delhi', 'bangalore',
-        'singapore', 'hong kong', 'seoul', 'beijing', 'shanghai', 'dubai',
-        'istanbul', 'cairo', 'rio de janeiro', 'sao paulo', 'mexico city',
-        'buenos aires', 'los angeles', 'chicago', 'san francisco', 'miami',
-        'boston', 'seattle', 'denver', 'phoenix', 'dallas', 'houston',
-        'osaka', 'kyoto', 'yokohama', 'nagoya', 'fukuoka', 'sapporo',
-        'sendai', 'hiroshima', 'kobe'
-    ]
-    
-    for pattern in location_patterns:
-        match = re.search(pattern, query, re.IGNORECASE)
+]
+
+# Known major cities for validation
+MAJOR_CITIES = frozenset([
+    'tokyo', 'new york', 'london', 'paris', 'berlin', 'moscow', 'sydney',
+    'melbourne', 'toronto', 'vancouver', 'mumbai', 'delhi', 'bangalore',
+    'singapore', 'hong kong', 'seoul', 'beijing', 'shanghai', 'dubai',
+    'istanbul', 'cairo', 'rio de janeiro', 'sao paulo', 'mexico city',
+    'buenos aires', 'los angeles', 'chicago', 'san francisco', 'miami',
+    'boston', 'seattle', 'denver', 'phoenix', 'dallas', 'houston',
+    'osaka', 'kyoto', 'yokohama', 'nagoya', 'fukuoka', 'sapporo',
+    'sendai', 'hiroshima', 'kobe'
+])
+
+# Common non-location words the patterns can pick up
+NON_LOCATION_WORDS = frozenset(['what', 'should', 'do', 'today', 'tomorrow', 'wear', 'activities', 'i', 'can'])
+
+
+def extract_location_from_query(query: str, language: str = "en") -> Optional[str]:
+    """Extract location name from user query as fallback if tool calling doesn't work"""
+    for pattern in LOCATION_PATTERNS:
+        match = pattern.search(query)
         if match:
             location = match.group(1).strip() if match.groups() else match.group(0).strip()
             # Filter out common non-location words
             location_lower = location.lower()
-            if location_lower not in ['what', 'should', 'do', 'today', 'tomorrow', 'wear', 'activities', 'i', 'can']:
+            if location_lower not in NON_LOCATION_WORDS:
                 # Check if it's a known city or looks like a city name (capitalized, 2+ chars)
-                if len(location) >= 2 and (location_lower in major_cities or location[0].isupper()):
+                if len(location) >= 2 and (location_lower in MAJOR_CITIES or location[0].isupper()):
                     return location
     
     return None
 
 
-def get_ai_suggestions(weather_data, user_query: Optional[str] = None, language: str = "en", auto_fetch_weather: bool = True):
-    """Get AI-powered suggestions based on weather with tool calling support"""
+async def stream_groq_completion(messages, tools=None, tool_choice: str = "auto"):
+    """
+    Stream a Groq chat completion while holding a Groq slot
+    Yields ("content", text) as the reply is generated, ("reset", None) if that text is being
+    regenerated after a failed tool call, then ("tool_calls", calls) if the model called tools
+    """
+    use_tools = bool(tools)
+    async with app.state.groq_sem:
+        while True:
+            tool_calls = {}
+            yielded = False
+            try:
+                # Try with tool calling if enabled
+                if use_tools:
+                    response = await groq_client.chat.completions.create(
+                        model="llama-3.3-70b-versatile",
+                        messages=messages,
+                        tools=tools,
+                        tool_choice=tool_choice,
+                        temperature=0.7,
+                        max_tokens=1000,
+                        stream=True
+                    )
+                else:
+                    response = await groq_client.chat.completions.create(
+                        model="llama-3.3-70b-versatile",
+                        messages=messages,
+                        temperature=0.7,
+                        max_tokens=1000,
+                        stream=True
+                    )
+                
+                # Generation errors (e.g. tool_use_failed) are raised while iterating
+                async for chunk in response:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta
+                    
+                    # Tool calls arrive in fragments; assemble them by index
+                    for tool_call in delta.tool_calls or []:
+                        call = tool_calls.setdefault(tool_call.index, {"id": None, "name": "", "arguments": ""})
+                        if tool_call.id:
+                            call["id"] = tool_call.id
+                        if tool_call.function and tool_call.function.name:
+                            call["name"] += tool_call.function.name
+                        if tool_call.function and tool_call.function.arguments:
+                            call["arguments"] += tool_call.function.arguments
+                    
+                    if delta.content:
+                        yielded = True
+                        yield "content", delta.content
+                break
+            except Exception as tool_error:
+                # If tool calling fails, try without tools
+                if use_tools and ("tool" in str(tool_error).lower() or "function" in str(tool_error).lower()):
+                    if yielded:
+                        yield "reset", None
+                    use_tools = False
+                    continue
+                raise
+    
+    if tool_calls:
+        yield "tool_calls", [tool_calls[index] for index in sorted(tool_calls)]
+
+
+async def stream_ai_suggestions(weather_data, user_query: Optional[str] = None, language: str = "en", auto_fetch_weather: bool = True):
+    """
+    Stream AI-powered suggestions based on weather with tool calling support
+    Yields ("delta", text) as the reply is generated, ("reset", None) if the text so far
+    turned out to precede a tool call and should be discarded, then one ("done", result) event
+    """
     
     # Define the weather tool
     tools = [
@@ -261,18 +531,7 @@ Important notes:
     # Build initial context
     weather_context = ""
     if weather_data:
-        location = weather_data['location']
-        current = weather_data['current']
-        weather_context = f"""
-Current weather in {location['name']}, {location['country']}:
-- Temperature: {current['temp_c']}°C (feels like {current['feelslike_c']}°C)
-- Condition: {current['condition']['text']}
-- Humidity: {current['humidity']}%
-- Wind: {current['wind_kph']} km/h
-- UV Index: {current['uv']}
-- Precipitation: {current['precip_mm']} mm
-- Local time: {location['localtime']}
-"""
+        weather_context = format_weather_context(weather_data, "Current weather in")
     
     # Build user prompt
     if user_query:
@@ -291,172 +550,155 @@ Current weather in {location['name']}, {location['country']}:
         {"role": "user", "content": prompt}
     ]
     
+    streamed = []  # Everything sent to the client so far
+    final_weather_data = weather_data
+    
     try:
-        # Call Groq API with tool support
-        max_iterations = 3  # Prevent infinite loops
-        iteration = 0
-        final_weather_data = weather_data
+        # Location named in the query, used if the model doesn't call the tool itself
+        fallback_location = extract_location_from_query(user_query, language) if user_query else None
         
-        while iteration < max_iterations:
-            try:
-                # Try with tool calling if enabled
-                if auto_fetch_weather:
-                    response = groq_client.chat.completions.create(
-                        model="llama-3.3-70b-versatile",
-                        messages=messages,
-                        tools=tools,
-                        tool_choice="auto",
-                        temperature=0.7,
-                        max_tokens=1000
-                    )
-                else:
-                    response = groq_client.chat.completions.create(
-                        model="llama-3.3-70b-versatile",
-                        messages=messages,
-                        temperature=0.7,
-                        max_tokens=1000
-                    )
-            except Exception as tool_error:
-                # If tool calling fails, try without tools
-                if "tool" in str(tool_error).lower() or "function" in str(tool_error).lower():
-                    response = groq_client.chat.completions.create(
-                        model="llama-3.3-70b-versatile",
-                        messages=messages,
-                        temperature=0.7,
-                        max_tokens=1000
-                    )
-                    auto_fetch_weather = False  # Disable tool calling for this request
-                else:
-                    raise tool_error
+        # First pass: the model either answers directly or asks for weather.
+        # Hold the answer back if the fallback below may replace it
+        content_parts = []
+        calls = []
+        async for event, data in stream_groq_completion(messages, tools if auto_fetch_weather else None):
+            if event == "tool_calls":
+                calls = data
+                continue
+            if event == "reset":
+                content_parts.clear()
+                if streamed:
+                    streamed.clear()
+                    yield "reset", None
+                continue
+            content_parts.append(data)
+            if not fallback_location:
+                streamed.append(data)
+                yield "delta", data
+        
+        follow_up = None
+        
+        # Check if the model wants to call a tool
+        if calls:
+            # Anything said before the tool call ("Let me check the weather...") isn't
+            # part of the answer; tell the client to discard it
+            if streamed:
+                streamed.clear()
+                yield "reset", None
             
-            message = response.choices[0].message
+            # Add assistant's message with tool calls
+            messages.append({
+                "role": "assistant",
+                "content": "".join(content_parts) or None,
+                "tool_calls": [
+                    {
+                        "id": call["id"],
+                        "type": "function",
+                        "function": {"name": call["name"], "arguments": call["arguments"]}
+                    }
+                    for call in calls
+                ]
+            })
             
-            # Check if the model wants to call a tool
-            if hasattr(message, 'tool_calls') and message.tool_calls and auto_fetch_weather:
-                # Add assistant's message with tool calls
-                messages.append(message)
+            # Execute all tool calls in parallel
+            weather_calls = [
+                (call, json.loads(call["arguments"]).get("location"))
+                for call in calls
+                if call["name"] == "get_weather"
+            ]
+            results = await asyncio.gather(
+                *(fetch_weather(location_name) for _, location_name in weather_calls),
+                return_exceptions=True
+            )
+            
+            for (call, location_name), fetched_weather in zip(weather_calls, results):
+                if isinstance(fetched_weather, Exception):
+                    # Add error to messages
+                    messages.append({
+                        "role": "tool",
+                        "tool_call_id": call["id"],
+                        "name": call["name"],
+                        "content": f"Error fetching weather for {location_name}: {str(fetched_weather)}"
+                    })
+                    continue
                 
-                # Execute tool calls
-                for tool_call in message.tool_calls:
-                    if tool_call.function.name == "get_weather":
-                        import json
-                        args = json.loads(tool_call.function.arguments)
-                        location_name = args.get("location")
-                        
-                        try:
-                            # Fetch weather for the requested location
-                            fetched_weather = fetch_weather(location_name)
-                            final_weather_data = fetched_weather
-                            
-                            # Format weather data for the model
-                            loc = fetched_weather['location']
-                            curr = fetched_weather['current']
-                            weather_info = f"""
-Weather in {loc['name']}, {loc['country']}:
-- Temperature: {curr['temp_c']}°C (feels like {curr['feelslike_c']}°C)
-- Condition: {curr['condition']['text']}
-- Humidity: {curr['humidity']}%
-- Wind: {curr['wind_kph']} km/h
-- UV Index: {curr['uv']}
-- Precipitation: {curr['precip_mm']} mm
-- Local time: {loc['localtime']}
-"""
-                            
-                            # Add tool result to messages
-                            messages.append({
-                                "role": "tool",
-                                "tool_call_id": tool_call.id,
-                                "name": tool_call.function.name,
-                                "content": weather_info
-                            })
-                        except Exception as e:
-                            # Add error to messages
-                            messages.append({
-                                "role": "tool",
-                                "tool_call_id": tool_call.id,
-                                "name": tool_call.function.name,
-                                "content": f"Error fetching weather for {location_name}: {str(e)}"
-                            })
+                final_weather_data = fetched_weather
                 
-                iteration += 1
-                continue  # Continue the loop to get the final response
-            
-            # No tool calls - check if we should extract location from query as fallback
-            if not hasattr(message, 'tool_calls') or not message.tool_calls:
-                # Try to extract location from query if no weather data or query mentions a location
-                if user_query and (not weather_data or iteration == 0):
-                    extracted_location = extract_location_from_query(user_query, language)
-                    if extracted_location:
-                        try:
-                            fetched_weather = fetch_weather(extracted_location)
-                            final_weather_data = fetched_weather
-                            
-                            # Update context with new weather
-                            loc = fetched_weather['location']
-                            curr = fetched_weather['current']
-                            weather_info = f"""
-Weather in {loc['name']}, {loc['country']}:
-- Temperature: {curr['temp_c']}°C (feels like {curr['feelslike_c']}°C)
-- Condition: {curr['condition']['text']}
-- Humidity: {curr['humidity']}%
-- Wind: {curr['wind_kph']} km/h
-- UV Index: {curr['uv']}
-- Precipitation: {curr['precip_mm']} mm
-- Local time: {loc['localtime']}
-"""
-                            
-                            # Update the prompt with new weather and ask again
-                            if language == 'ja':
-                                updated_prompt = f"{weather_info}\n\nユーザーの質問: {user_query}\n\n上記の天気を考慮して、詳細な提案を提供してください。"
-                            else:
-                                updated_prompt = f"{weather_info}\n\nUser query: {user_query}\n\nProvide detailed suggestions considering the weather above."
-                            
-                            messages = [
-                                {"role": "system", "content": system_prompt},
-                                {"role": "user", "content": updated_prompt}
-                            ]
-                            iteration += 1
-                            continue
-                        except Exception:
-                            pass  # Continue with original weather if extraction fails
-            
-            # No tool calls, return the final response
-            final_response = message.content
-            
-            # Update weather context if we fetched new weather
-            if final_weather_data and final_weather_data != weather_data:
-                # Rebuild context with new weather
-                loc = final_weather_data['location']
-                curr = final_weather_data['current']
-                weather_context = f"""
-Current weather in {loc['name']}, {loc['country']}:
-- Temperature: {curr['temp_c']}°C (feels like {curr['feelslike_c']}°C)
-- Condition: {curr['condition']['text']}
-- Humidity: {curr['humidity']}%
-- Wind: {curr['wind_kph']} km/h
-- UV Index: {curr['uv']}
-- Precipitation: {curr['precip_mm']} mm
-- Local time: {loc['localtime']}
-"""
+                # Format weather data for the model
+                weather_info = format_weather_context(fetched_weather)
+                
+                # Add tool result to messages
+                messages.append({
+                    "role": "tool",
+                    "tool_call_id": call["id"],
+                    "name": call["name"],
+                    "content": weather_info
+                })
             
-            return {
-                "content": final_response,
-                "weather_data": final_weather_data  # Return the weather data used (may be updated)
-            }
+            # One final answer; the tools stay declared but can't be called again
+            follow_up = stream_groq_completion(messages, tools, tool_choice="none")
         
-        # If we hit max iterations, return error
-        return {
-            "content": "Error: Maximum iterations reached while processing your request.",
-            "weather_data": final_weather_data
+        # No tool calls - fall back to the location extracted from the query
+        elif fallback_location:
+            try:
+                fetched_weather = await fetch_weather(fallback_location)
+                final_weather_data = fetched_weather
+                
+                # Update context with new weather
+                weather_info = format_weather_context(fetched_weather)
+                
+                # Update the prompt with new weather and ask again
+                if language == 'ja':
+                    updated_prompt = f"{weather_info}\n\nユーザーの質問: {user_query}\n\n上記の天気を考慮して、詳細な提案を提供してください。"
+                else:
+                    updated_prompt = f"{weather_info}\n\nUser query: {user_query}\n\nProvide detailed suggestions considering the weather above."
+                
+                follow_up = stream_groq_completion([
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": updated_prompt}
+                ])
+            except Exception:
+                pass  # Continue with original weather if extraction fails
+        
+        if follow_up:
+            async for event, data in follow_up:
+                if event == "reset" and streamed:
+                    streamed.clear()
+                    yield "reset", None
+                elif event == "content":
+                    streamed.append(data)
+                    yield "delta", data
+        elif fallback_location and content_parts:
+            # The first answer is final after all; release what was held back
+            held_back = "".join(content_parts)
+            streamed.append(held_back)
+            yield "delta", held_back
+        
+        yield "done", {
+            "content": "".join(streamed),
+            "weather_data": final_weather_data  # Return the weather data used (may be updated)
         }
         
     except Exception as e:
-        return {
-            "content": f"Error getting AI suggestions: {str(e)}",
+        # Replace any partial reply with just the error, rather than appending to it
+        error_message = f"Error getting AI suggestions: {str(e)}"
+        if streamed:
+            streamed.clear()
+            yield "reset", None
+        yield "delta", error_message
+        yield "done", {
+            "content": error_message,
             "weather_data": weather_data
         }
 
 
+async def get_ai_suggestions(weather_data, user_query: Optional[str] = None, language: str = "en", auto_fetch_weather: bool = True):
+    """Get AI-powered suggestions based on weather with tool calling support"""
+    async for event, data in stream_ai_suggestions(weather_data, user_query, language, auto_fetch_weather):
+        if event == "done":
+            return data
+
+
 # API Endpoints
 
 @app.get("/")
@@ -469,87 +711,110 @@ def get_translations(language: str):
     """Get translations for a specific language"""
     if language not in translations:
         raise HTTPException(status_code=400, detail="Language not supported")
-    return translations[language]
+    return Response(content=TRANSLATIONS_JSON[language], media_type="application/json")
 
 
 @app.post("/api/weather")
-def get_weather(request: WeatherRequest):
+async def get_weather(request: WeatherRequest):
     """Fetch weather data for a location"""
-    weather_data = fetch_weather(request.location)
+    weather_data = await fetch_weather(request.location)
     formatted = format_weather_data(weather_data)
     return formatted
 
 
 @app.post("/api/suggestions")
-def get_suggestions(request: ChatRequest):
-    """Get AI suggestions based on weather and optional query with automatic weather fetching"""
+async def get_suggestions(request: ChatRequest):
+    """Stream AI suggestions based on weather and optional query with automatic weather fetching"""
     session_id = request.session_id
     
     # Get or create session
-    if session_id not in sessions:
+    session = await load_session(session_id)
+    if session is None:
         raise HTTPException(status_code=404, detail="Session not found. Please fetch weather first.")
     
-    session = sessions[session_id]
     weather_data = session.get('weather_data')
     
-    # Allow suggestions even without initial weather - agent can fetch it
-    result = get_ai_suggestions(weather_data, request.query, request.language, auto_fetch_weather=True)
-    
-    # Update session with new weather data if agent fetched it
-    if result.get('weather_data') and result['weather_data'] != weather_data:
-        session['weather_data'] = result['weather_data']
-        # Format the new weather for display
-        session['formatted_weather'] = format_weather_data(result['weather_data'])
-    
-    suggestion = result['content']
-    
-    # If there's a query, add to chat history
-    if request.query:
-        if 'chat_history' not in session:
-            session['chat_history'] = []
-        session['chat_history'].append({
-            'role': 'user',
-            'content': request.query
-        })
-        session['chat_history'].append({
-            'role': 'assistant',
-            'content': suggestion
-        })
-    
-    # Return updated weather if it was fetched
-    response = {
-        "suggestion": suggestion,
-        "chat_history": session.get('chat_history', [])
-    }
-    
-    # Include updated weather if it changed
-    if result.get('weather_data') and result['weather_data'] != weather_data:
-        response['weather'] = format_weather_data(result['weather_data'])
-        response['weather_updated'] = True
+    async def event_stream():
+        # Allow suggestions even without initial weather - agent can fetch it
+        result = None
+        async for event, data in stream_ai_suggestions(weather_data, request.query, request.language, auto_fetch_weather=True):
+            if event == "delta":
+                yield f"data: {json.dumps({'delta': data})}\n\n"
+            elif event == "reset":
+                yield "event: reset\ndata: {}\n\n"
+            else:
+                result = data
+        
+        weather_changed = bool(result.get('weather_data')) and result['weather_data'] != weather_data
+        
+        # Update session with new weather data if agent fetched it. Re-read it first:
+        # the copy loaded above is stale after the stream and may have been replaced
+        # If the session expired or was deleted meanwhile, don't recreate it from stale data
+        if weather_changed:
+            latest_session = await load_session(session_id)
+            if latest_session is not None:
+                latest_session['weather_data'] = result['weather_data']
+                # Format the new weather for display
+                latest_session['formatted_weather'] = format_weather_data(result['weather_data'])
+                await save_session(session_id, latest_session)
+        else:
+            await touch_session(session_id)
+        
+        suggestion = result['content']
+        
+        # If there's a query, add to chat history
+        if request.query:
+            await append_chat_history(
+                session_id,
+                {'role': 'user', 'content': request.query},
+                {'role': 'assistant', 'content': suggestion}
+            )
+        
+        # Return updated weather if it was fetched
+        response = {
+            "suggestion": suggestion,
+            "chat_history": await load_chat_history(session_id)
+        }
+        
+        # Include updated weather if it changed
+        if weather_changed:
+            response['weather'] = format_weather_data(result['weather_data'])
+            response['weather_updated'] = True
+        
+        yield f"event: done\ndata: {json.dumps(response)}\n\n"
     
-    return response
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
 
 
 @app.post("/api/weather-with-suggestions")
-def get_weather_with_suggestions(request: WeatherRequest, language: str = "en", session_id: Optional[str] = None):
+async def get_weather_with_suggestions(request: WeatherRequest, language: str = "en", session_id: Optional[str] = None):
     """Fetch weather and get initial AI suggestions"""
-    import uuid
-    
-    weather_data = fetch_weather(request.location)
-    formatted = format_weather_data(weather_data)
+    weather_data = await fetch_weather(request.location)
     
-    # Create or update session
-    if not session_id:
-        session_id = str(uuid.uuid4())
+    # Start the initial suggestion right away; the session work below overlaps with it
+    suggestion_task = asyncio.create_task(
+        get_ai_suggestions(weather_data, None, language, auto_fetch_weather=False)
+    )
     
-    sessions[session_id] = {
-        'weather_data': weather_data,
-        'chat_history': [],
-        'language': language
-    }
+    try:
+        formatted = format_weather_data(weather_data)
+        
+        # Create or update session
+        if not session_id:
+            session_id = str(uuid.uuid4())
+        
+        await asyncio.gather(
+            save_session(session_id, {
+                'weather_data': weather_data,
+                'language': language
+            }),
+            clear_chat_history(session_id)
+        )
+    except BaseException:
+        suggestion_task.cancel()
+        raise
     
-    # Get initial suggestion
-    result = get_ai_suggestions(weather_data, None, language, auto_fetch_weather=False)
+    result = await suggestion_task
     suggestion = result['content'] if isinstance(result, dict) else result
     
     return {
@@ -566,10 +831,8 @@ async def transcribe_audio(
     session_id: Optional[str] = Form(None)
 ):
     """Transcribe uploaded audio file"""
-    audio_bytes = await file.read()
-    file_format = file.filename.split('.')[-1].lower() if file.filename else None
-    
-    transcript = transcribe_audio_deepgram(audio_bytes, file_format, language)
+    # Stream the upload through to Deepgram instead of buffering it
+    transcript = await transcribe_audio_deepgram(iter_upload(file), file.content_type, language)
     
     if transcript:
         return {"transcript": transcript, "success": True}
@@ -578,46 +841,42 @@ async def transcribe_audio(
 
 
 @app.get("/api/session/{session_id}")
-def get_session(session_id: str):
+async def get_session(session_id: str):
     """Get session data"""
-    if session_id not in sessions:
+    session = await load_session(session_id)
+    if session is None:
         raise HTTPException(status_code=404, detail="Session not found")
-    return sessions[session_id]
+    session['chat_history'] = await load_chat_history(session_id)
+    return session
 
 
 @app.delete("/api/session/{session_id}/chat")
-def clear_chat(session_id: str):
+async def clear_chat(session_id: str):
     """Clear chat history for a session"""
-    if session_id not in sessions:
+    session = await load_session(session_id)
+    if session is None:
         raise HTTPException(status_code=404, detail="Session not found")
-    sessions[session_id]['chat_history'] = []
+    await clear_chat_history(session_id)
     return {"message": "Chat history cleared"}
 
 
 @app.get("/api/examples/{language}")
 def get_examples(language: str):
     """Get example prompts for a language"""
-    if language == 'ja':
-        return {
-            "examples": [
-                "今日は何を着ればいいですか？",
-                "外出するのに良い時間は？",
-                "雨が降るので、室内でできることは？",
-                "この天気でおすすめのスポーツは？"
-            ]
-        }
-    else:
-        return {
-            "examples": [
-                "What should I wear today?",
-                "Best time to go outside?",
-                "Indoor activities for this weather?",
-                "Recommended sports for this weather?"
-            ]
-        }
+    return Response(content=EXAMPLES_JSON.get(language, EXAMPLES_JSON['en']), media_type="application/json")
 
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Multiple workers need an import string; sessions are shared through Redis
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=os.cpu_count(),
+        loop="uvloop",
+        http="httptools",
+        limit_concurrency=1000,
+        timeout_keep_alive=30
+    )
 
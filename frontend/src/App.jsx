@@ -113,35 +113,84 @@ function App() {
   const sendQueryToAPI = async (sessionId, query) => {
     setLoading(true)
     try {
-      const response = await axios.post(`${API_BASE_URL}/api/suggestions`, {
-        session_id: sessionId,
-        query,
-        language
+      const response = await fetch(`${API_BASE_URL}/api/suggestions`, {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+          Accept: 'text/event-stream'
+        },
+        body: JSON.stringify({
+          session_id: sessionId,
+          query,
+          language
+        })
       })
       
-      // Update weather if agent automatically fetched it for a different location
-      if (response.data.weather_updated && response.data.weather) {
-        setWeather(response.data.weather)
-        // Add weather update message
-        const weatherUpdate = {
-          role: 'assistant',
-          content: `🌤️ Weather updated for ${response.data.weather.location}`,
-          type: 'weather',
-          weather: response.data.weather
+      if (!response.ok) {
+        const errorData = await response.json().catch(() => ({}))
+        throw new Error(errorData.detail || 'Error getting AI response')
+      }
+      
+      // Show the reply as it streams in
+      let streamed = ''
+      setChatHistory(prev => [...prev, { role: 'assistant', content: '', type: 'text' }])
+      
+      const handleEvent = (rawEvent) => {
+        let eventName = 'message'
+        let data = ''
+        for (const line of rawEvent.split('\n')) {
+          if (line.startsWith('event: ')) eventName = line.slice(7)
+          else if (line.startsWith('data: ')) data += line.slice(6)
+        }
+        if (!data) return
+        const payload = JSON.parse(data)
+        
+        if (eventName === 'done') {
+          // Update weather if agent automatically fetched it for a different location
+          if (payload.weather_updated && payload.weather) {
+            setWeather(payload.weather)
+            // Add weather update message
+            const weatherUpdate = {
+              role: 'assistant',
+              content: `🌤️ Weather updated for ${payload.weather.location}`,
+              type: 'weather',
+              weather: payload.weather
+            }
+            setChatHistory(prev => [...prev, weatherUpdate])
+          }
+          
+          // Update chat history with the response
+          setChatHistory(payload.chat_history.map(msg => ({
+            ...msg,
+            type: msg.role === 'assistant' ? 'text' : 'text'
+          })))
+        } else if (eventName === 'reset') {
+          // Text so far preceded a tool call; the real answer follows
+          streamed = ''
+          setChatHistory(prev => [...prev.slice(0, -1), { role: 'assistant', content: '', type: 'text' }])
+        } else {
+          streamed += payload.delta
+          const content = streamed
+          setChatHistory(prev => [...prev.slice(0, -1), { role: 'assistant', content, type: 'text' }])
         }
-        setChatHistory(prev => [...prev, weatherUpdate])
       }
       
-      // Update chat history with the response
-      setChatHistory(response.data.chat_history.map(msg => ({
-        ...msg,
-        type: msg.role === 'assistant' ? 'text' : 'text'
-      })))
+      const reader = response.body.getReader()
+      const decoder = new TextDecoder()
+      let buffer = ''
+      while (true) {
+        const { done, value } = await reader.read()
+        if (done) break
+        buffer += decoder.decode(value, { stream: true })
+        const events = buffer.split('\n\n')
+        buffer = events.pop()
+        events.forEach(handleEvent)
+      }
     } catch (error) {
       console.error('Error getting suggestions:', error)
       const errorMessage = {
         role: 'assistant',
-        content: error.response?.data?.detail || 'Error getting AI response',
+        content: error.message || 'Error getting AI response',
         type: 'error'
       }
       setChatHistory(prev => [...prev, errorMessage])